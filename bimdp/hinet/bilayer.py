@@ -37,6 +37,10 @@ class CloneBiLayer(BiNode, hinet.CloneLayer):
     the use_copies msg key.
     """
 
+    # (nodes, matrices, biases) with the stacked projections of the
+    # node copies, see _execute_linear
+    _stacked = None
+
     def __init__(self, node, n_nodes=1, use_copies=False,
                  node_id=None, dtype=None):
         """Initialize the internal variables.
@@ -107,6 +111,10 @@ def _execute(self, x, msg=None):
         """Process the data through the internal nodes."""
         if msg is not None:
             self._extract_message_copy_flag(msg)
+        if (not msg) and (x is not None):
+            y = self._execute_linear(x)
+            if y is not None:
+                return y
         y_results = []
         msg_results = []
         target = None
@@ -155,6 +163,7 @@ def _train(self, x, msg=None):
         """Perform single training step by training the internal nodes."""
         ## this code is mostly identical to the execute code,
         ## currently the only difference is that train is called
+        self._stacked = None
         if msg is not None:
             self._extract_message_copy_flag(msg)
         y_results = []
@@ -207,6 +216,7 @@ def _stop_training(self, msg=None):
         The outgoing result message is also searched for a use_copies key,
         which is then applied if found.
         """
+        self._stacked = None
         if msg is not None:
             self._extract_message_copy_flag(msg)
         target = None
@@ -255,6 +265,68 @@ def _stop_training(self, msg=None):
         else:
             return y
 
+    def _execute_linear(self, x):
+        """Return the result of the internal nodes for all the parts of x
+        at once.
+
+        This is only possible if the internal nodes are trained linear
+        projection nodes (e.g. SFANode), otherwise None is returned.
+        For a single node instance x is reshaped so that all the parts are
+        projected with a single matrix multiplication. The projections of
+        node copies are cached in stacked arrays and applied to the parts
+        of x one after the other.
+        """
+        n_nodes = len(self.nodes)
+        if not self.use_copies:
+            transform = mdp.utils.get_affine_transform(self.node)
+            if transform is None:
+                return None
+            matrix, bias = transform
+            if not (x.ndim == 2 and x.shape[1] == n_nodes * matrix.shape[0]):
+                return None
+            x = mdp.utils.refcast(x, self.node.dtype)
+            y = mdp.utils.mult(x.reshape(-1, matrix.shape[0]), matrix) - bias
+            return y.reshape(len(x), n_nodes * matrix.shape[1])
+        if mdp.get_active_extensions():
+            return None
+        if (self._stacked is None) or (self._stacked[0] != self.nodes):
+            self._stacked = self._stack_transforms()
+        nodes, matrices, biases = self._stacked
+        if (matrices is None or
+            not (x.ndim == 2 and x.shape[1] == n_nodes * matrices.shape[1])):
+            return None
+        x = mdp.utils.refcast(x, matrices.dtype)
+        x = x.reshape(len(x), n_nodes, matrices.shape[1])
+        y = n.empty((len(x), n_nodes, matrices.shape[2]), dtype=matrices.dtype)
+        # note: n.einsum does not use BLAS and is much slower than this loop
+        for i in range(n_nodes):
+            y[:, i, :] = mdp.utils.mult(x[:, i, :], matrices[i]) - biases[i]
+        return y.reshape(len(x), n_nodes * matrices.shape[2])
+
+    def _stack_transforms(self):
+        """Return the (nodes, matrices, biases) tuple for the node copies.
+
+        matrices and biases are None if the nodes are not all trained linear
+        projection nodes with the same dimensions and dtype.
+        """
+        nodes = list(self.nodes)
+        transforms = [mdp.utils.get_affine_transform(node)
+                      for node in nodes]
+        if any([transform is None for transform in transforms]):
+            return nodes, None, None
+        matrices = [matrix for matrix, _ in transforms]
+        if ((len(set([matrix.shape for matrix in matrices])) != 1) or
+            (len(set([node.dtype for node in nodes])) != 1)):
+            return nodes, None, None
+        biases = [bias.reshape(-1) for _, bias in transforms]
+        return nodes, n.array(matrices), n.array(biases)
+
+    def __getstate__(self):
+        # the stacked projections are only a cache of the node arrays
+        state = self.__dict__.copy()
+        state.pop('_stacked', None)
+        return state
+
     ## BiNode methods ##
 
     def _bi_reset(self):
@@ -307,10 +379,11 @@ def _get_split_messages(self, msg):
             if (isinstance(value, n.ndarray) and
                 # check if the array can be split up
                 len(value.shape) >= 2 and not value.shape[1] % n_nodes):
-                # split the data along the second index
-                split_values = n.hsplit(value, n_nodes)
-                for i, split_value in enumerate(split_values):
-                    msgs[i][key] = split_value
+                # split the data along the second index,
+                # slicing creates views, so the data is not copied
+                node_dim = value.shape[1] // n_nodes
+                for i, node_msg in enumerate(msgs):
+                    node_msg[key] = value[:, node_dim*i : node_dim*(i+1)]
             else:
                 for node_msg in msgs:
                     # Note: the value is not copied, just referenced
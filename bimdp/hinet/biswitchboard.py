@@ -64,11 +64,12 @@ def _inverse_msg(self, msg):
         """Inverse routing for msg."""
         if not msg:
             return None
+        route = super(BiSwitchboard, self)._inverse
         out_msg = {}
         for (key, value) in msg.items():
             if (type(value) is n.ndarray and
                 len(value.shape) >= 2 and value.shape[1] == self.output_dim):
-                out_msg[key] = super(BiSwitchboard, self)._inverse(value)
+                out_msg[key] = route(value)
             else:
                 out_msg[key] = value
         return out_msg
@@ -77,11 +78,12 @@ def _execute_msg(self, msg):
         """Feed-forward routing for msg."""
         if not msg:
             return None
+        route = super(BiSwitchboard, self)._execute
         out_msg = {}
         for (key, value) in msg.items():
             if (type(value) is n.ndarray and
                 len(value.shape) >= 2 and value.shape[1] == self.input_dim):
-                out_msg[key] = super(BiSwitchboard, self)._execute(value)
+                out_msg[key] = route(value)
             else:
                 out_msg[key] = value
         return out_msg
@@ -71,6 +71,32 @@ def test_clonelayer(self):
         clonelayer.stop_training()
         clonelayer.execute(x)
 
+    def test_clonelayer_linear(self):
+        """Test the combined execution of linear nodes."""
+        sfa_node = SFABiNode(input_dim=3, output_dim=2)
+        clonelayer = CloneBiLayer(sfa_node, 3)
+        x = n.random.random((100,9))
+        clonelayer.train(x)
+        clonelayer.stop_training()
+        ref_y = n.hstack([sfa_node.execute(x[:, 3*i : 3*(i+1)])
+                          for i in range(3)])
+        assert n.allclose(clonelayer.execute(x), ref_y)
+        clonelayer.use_copies = True
+        assert n.allclose(clonelayer.execute(x), ref_y)
+
+    def test_clonelayer_linear_copies(self):
+        """Test the combined execution of separately trained node copies."""
+        sfa_node = SFABiNode(input_dim=3, output_dim=2)
+        clonelayer = CloneBiLayer(sfa_node, 3, use_copies=True)
+        x = n.random.random((100,9))
+        clonelayer.train(x)
+        clonelayer.stop_training()
+        ref_y = n.hstack([node.execute(x[:, 3*i : 3*(i+1)])
+                          for i, node in enumerate(clonelayer.nodes)])
+        assert n.allclose(clonelayer.execute(x), ref_y)
+        # the copy of the layer gives the same result
+        assert n.allclose(clonelayer.copy().execute(x), ref_y)
+
     def test_use_copies_msg(self):
         """Test the correct reaction to an outgoing use_copies message."""
         stop_result = ({"clonelayer" + MSG_ID_SEP + "use_copies": True}, 1)
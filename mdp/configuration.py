@@ -60,6 +60,8 @@ class methods `ExternalDepFound` and `ExternalDepFailed`.
         inhibit loading of the ``joblib`` module and `mdp.caching`
       ``MDP_DISABLE_SKLEARN``
         inhibit loading of the ``sklearn`` module
+      ``MDP_DISABLE_NUMBA``
+        inhibit loading of the ``numba`` module, used by `Flow.compile`
       ``MDPNSDEBUG``
         print debugging information during the import process
       ``MDP_PP_SECRET``
@@ -144,6 +146,7 @@ def info(cls):
                   libsvm: libsvm.so.3
                   joblib: 0.5.4
                  sklearn: 0.9
+                   numba: not imported
                     numx: scipy 0.9.0
                   symeig: scipy.linalg.eigh
 
@@ -423,3 +426,22 @@ def set_configuration():
                                      'version %s is too old' % version)
         else:
             config.ExternalDepFound('sklearn', version)
+
+    # numba, importing it is slow so it is only located here and
+    # imported by Flow.compile
+    try:
+        from importlib.util import find_spec as find_module
+    except ImportError:
+        from pkgutil import find_loader as find_module
+    try:
+        # numba needs the scipy BLAS bindings to compile numpy.dot
+        for name in ('numba', 'scipy.linalg.cython_blas'):
+            if find_module(name) is None:
+                raise ImportError('No module named %s' % name)
+    except ImportError, exc:
+        config.ExternalDepFailed('numba', exc)
+    else:
+        if os.getenv('MDP_DISABLE_NUMBA'):
+            config.ExternalDepFailed('numba', 'disabled')
+        else:
+            config.ExternalDepFound('numba', 'not imported')
@@ -53,7 +53,9 @@ def __init__(self, input_dim, connections):
                    "indices exceed the input dimension.")
             raise SwitchboardException(err)
         # checks passed
-        self.connections = numx.array(connections)
+        # store the connections with the native index type, otherwise
+        # numpy converts them for every indexing operation
+        self.connections = numx.array(connections, dtype=numx.intp)
         output_dim = len(connections)
         super(Switchboard, self).__init__(input_dim=input_dim,
                                           output_dim=output_dim)
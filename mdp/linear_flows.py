@@ -5,6 +5,7 @@
 import inspect as _inspect
 import warnings as _warnings
 import traceback as _traceback
+import linecache as _linecache
 import cPickle as _cPickle
 import tempfile as _tempfile
 import copy as _copy
@@ -53,25 +54,101 @@ class FlowExceptionCR(CrashRecoveryException, FlowException):
     def __init__(self, *args):
         """Allow crash recovery.
 
-        Arguments: (error_string, flow_instance, parent_exception)
+        Arguments: (error_string, flow_instance, parent_exception
+                    [, node_traceback])
         The triggering parent exception is kept in self.parent_exception.
         If flow_instance._crash_recovery is set, save a crash dump of
-        flow_instance on the file self.filename"""
+        flow_instance on the file self.filename
+        node_traceback is an optional list of (filename, line number,
+        function name) tuples for the parent exception. It is only
+        formatted when the exception is converted to a string."""
         CrashRecoveryException.__init__(self, *args)
         rec = self.crashing_obj._crash_recovery
         errstr = args[0]
+        self._header = errstr
+        self._dumpinfo = ''
+        self._node_traceback = args[3] if len(args) > 3 else None
+        self._str = None
         if rec:
             if isinstance(rec, str):
                 name = rec
             else:
                 name = None
             name = CrashRecoveryException.dump(self, name)
-            dumpinfo = '\nA crash dump is available on: "%s"' % name
+            self._dumpinfo = '\nA crash dump is available on: "%s"' % name
             self.filename = name
-            errstr = errstr+dumpinfo
+            errstr = str(errstr)+self._dumpinfo
 
         Exception.__init__(self, errstr)
 
+    def __str__(self):
+        if self._node_traceback is None:
+            return Exception.__str__(self)
+        if self._str is None:
+            entries = []
+            for filename, lineno, name in self._node_traceback:
+                _linecache.checkcache(filename)
+                line = _linecache.getline(filename, lineno).strip()
+                entries.append((filename, lineno, name, line or None))
+            except_ = self.parent_exception
+            prev = ['Traceback (most recent call last):\n']
+            prev.extend(_traceback.format_list(entries))
+            prev.extend(_traceback.format_exception_only(except_.__class__,
+                                                         except_))
+            self._str = ''.join(['\n', 40*'-', self._header,
+                                 'Node Traceback:\n'] + prev +
+                                [40*'-', self._dumpinfo])
+        return self._str
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.args[0])
+
+def _is_affine_input(x, matrix):
+    """Return True if 'x' is a valid input for the projection 'matrix'."""
+    return (isinstance(x, numx.ndarray) and x.ndim == 2 and
+            x.shape[1] == matrix.shape[0])
+
+def _execute_affine_chain(x, matrices, biases):
+    """Apply the transformations 'mult(x, matrix) - bias' one after the other.
+
+    This function is compiled with numba when available.
+    """
+    for i in range(len(matrices)):
+        x = numx.dot(x, matrices[i]) - biases[i]
+    return x
+
+# version of _execute_affine_chain used by compiled flows,
+# set by _get_affine_chain
+_affine_chain = None
+
+def _get_affine_chain():
+    """Return _execute_affine_chain, compiled with numba if available.
+
+    numba is only imported the first time this function is called.
+    """
+    global _affine_chain
+    if _affine_chain is None:
+        if mdp.config.has_numba:
+            import numba
+            _affine_chain = numba.njit(cache=True)(_execute_affine_chain)
+        else:
+            _affine_chain = _execute_affine_chain
+    return _affine_chain
+
+class _SharedTrainingData(list):
+    """List with the single data array that is used to train all the
+    nodes in a flow.
+
+    The array filtered through the nodes 0..'nodenr' is kept in 'filtered',
+    so that it is computed only once for all the nodes and training phases.
+    """
+
+    def __init__(self, x):
+        list.__init__(self, [x])
+        self.filtered = x
+        self.nodenr = -1
+
+
 class Flow(object):
     """A 'Flow' is a sequence of nodes that are trained and executed
     together to form a more complex algorithm.  Input data is sent to the
@@ -93,7 +170,18 @@ class Flow(object):
     corresponding 'save' and 'copy' methods.
     """
 
-    def __init__(self, flow, crash_recovery=False, verbose=False):
+    # (nodes, dtype, matrices, biases) of the flow nodes, set by 'compile'
+    _compiled = None
+    # dict mapping the index of the first node in a run of linear nodes
+    # to (nodes, stop index, dtype, matrix, bias) of the combined projection
+    _fused = None
+    # kind of input for which 'execute' and 'inverse' are specialized
+    _input_mode = None
+    # dtype to which the input data is cast, None to keep the data dtype
+    dtype = None
+
+    def __init__(self, flow, crash_recovery=False, verbose=False,
+                 input_mode=None, dtype=None):
         """
         Keyword arguments:
 
@@ -101,28 +189,49 @@ def __init__(self, flow, crash_recovery=False, verbose=False):
         crash_recovery -- set (or not) Crash Recovery Mode (save node
                           in case a failure)
         verbose -- if True, print some basic progress information
+        input_mode -- if 'array' or 'iterable', 'execute' and 'inverse'
+                      only accept this kind of input (see 'set_input_mode')
+        dtype -- if given, the data arrays are cast to this dtype before
+                 they are sent through the nodes, nodes without a dtype
+                 inherit it in the training (e.g. 'float32' halves the
+                 memory traffic of float64 data). Only floating point
+                 dtypes are supported.
         """
         self._check_nodes_consistency(flow)
         self.flow = flow
         self.verbose = verbose
+        if dtype is not None:
+            dtype = numx.dtype(dtype)
+            if dtype not in mdp.utils.get_dtypes('Float'):
+                err_str = ("dtype %s is not supported, use one of %s" %
+                           (dtype, mdp.utils.get_dtypes('Float')))
+                raise FlowException(err_str)
+            self.dtype = dtype
         self.set_crash_recovery(crash_recovery)
+        self.set_input_mode(input_mode)
 
     def _propagate_exception(self, except_, nodenr):
         # capture exception. the traceback of the error is printed and a
         # new exception, containing the identity of the node in the flow
-        # is raised. Allow crash recovery.
-        (etype, val, tb) = _sys.exc_info()
-        prev = ''.join(_traceback.format_exception(except_.__class__,
-                                                   except_,tb))
-        act = "\n! Exception in node #%d (%s):\n" % (nodenr,
-                                                     str(self.flow[nodenr]))
-        errstr = ''.join(('\n', 40*'-', act, 'Node Traceback:\n', prev, 40*'-'))
-        raise FlowExceptionCR(errstr, self, except_)
-
-    def _train_node(self, data_iterable, nodenr):
+        # is raised. Allow crash recovery. Only the location of the
+        # traceback entries is kept (no frames), it is formatted when the
+        # error string is needed.
+        tb = _sys.exc_info()[2]
+        node_tb = []
+        while tb is not None:
+            code = tb.tb_frame.f_code
+            node_tb.append((code.co_filename, tb.tb_lineno, code.co_name))
+            tb = tb.tb_next
+        errstr = "\n! Exception in node #%d (%s):\n" % (nodenr,
+                                                       str(self.flow[nodenr]))
+        raise FlowExceptionCR(errstr, self, except_, node_tb)
+
+    def _train_node(self, data_iterable, nodenr, cache_data=False):
         """Train a single node in the flow.
 
         nodenr -- index of the node in the flow
+        cache_data -- if True, store the data filtered through the previous
+                      nodes in the first training phase (see 'train')
         """
         node = self.flow[nodenr]
         if (data_iterable is not None) and (not node.is_trainable()):
@@ -144,7 +253,15 @@ def _train_node(self, data_iterable, nodenr):
 
         try:
             train_arg_keys = self._get_required_train_args(node)
-            train_args_needed = bool(len(train_arg_keys))
+            n_train_args = len(train_arg_keys)
+            shared_data = isinstance(data_iterable, _SharedTrainingData)
+            # list of the filtered (x, arg) tuples collected in the first
+            # training phase, and the same list once it can be reused
+            collected = None
+            filtered = None
+            if (cache_data and nodenr > 0 and (not shared_data) and
+                node.get_remaining_train_phase() > 1):
+                collected = []
             ## We leave the last training phase open for the
             ## CheckpointFlow class.
             ## Checkpoint functions must close it explicitly if needed!
@@ -152,31 +269,46 @@ def _train_node(self, data_iterable, nodenr):
             ## automatically when the node is executed.
             while True:
                 empty_iterator = True
-                for x in data_iterable:
-                    empty_iterator = False
-                    # the arguments following the first are passed only to the
-                    # currently trained node, allowing the implementation of
-                    # supervised nodes
-                    if (type(x) is tuple) or (type(x) is list):
-                        arg = x[1:]
-                        x = x[0]
-                    else:
-                        arg = ()
-                    # check if the required number of arguments was given
-                    if train_args_needed:
-                        if len(train_arg_keys) != len(arg):
-                            err = ("Wrong number of arguments provided by " +
-                                   "the iterable for node #%d " % nodenr +
-                                   "(%d needed, %d given).\n" %
-                                   (len(train_arg_keys), len(arg)) +
-                                   "List of required argument keys: " +
-                                   str(train_arg_keys))
-                            raise FlowException(err)
-                    # filter x through the previous nodes
-                    if nodenr > 0:
-                        x = self._execute_seq(x, nodenr-1)
-                    # train current node
-                    node.train(x, *arg)
+                if filtered is not None:
+                    # reuse the data that was filtered in the first phase
+                    for x, arg in filtered:
+                        empty_iterator = False
+                        node.train(x, *arg)
+                else:
+                    for x in data_iterable:
+                        empty_iterator = False
+                        # the arguments following the first are passed only to
+                        # the currently trained node, allowing the
+                        # implementation of supervised nodes
+                        if (type(x) is tuple) or (type(x) is list):
+                            arg = x[1:]
+                            x = x[0]
+                        else:
+                            arg = ()
+                        if self.dtype is not None:
+                            x = mdp.utils.refcast(x, self.dtype)
+                        # check if the required number of arguments was given
+                        if n_train_args:
+                            if n_train_args != len(arg):
+                                err = ("Wrong number of arguments provided " +
+                                       "by the iterable for node #%d " %
+                                       nodenr +
+                                       "(%d needed, %d given).\n" %
+                                       (n_train_args, len(arg)) +
+                                       "List of required argument keys: " +
+                                       str(train_arg_keys))
+                                raise FlowException(err)
+                        # filter x through the previous nodes
+                        if nodenr > 0:
+                            if shared_data:
+                                x = self._execute_shared_data(data_iterable,
+                                                              nodenr-1)
+                            else:
+                                x = self._execute_seq(x, nodenr-1)
+                        # train current node
+                        node.train(x, *arg)
+                        if collected is not None:
+                            collected.append((x, arg))
                 if empty_iterator:
                     if node.get_current_train_phase() == 1:
                         err_str = ("The training data iteration for node "
@@ -189,6 +321,13 @@ def _train_node(self, data_iterable, nodenr):
                         err_str = ("The training data iterator for node "
                                    "no. %d is empty." % (nodenr+1))
                         raise FlowException(err_str)
+                if collected is not None:
+                    # the filtered data can only be reused if the previous
+                    # nodes are not modified by the training anymore
+                    if not any([prev_node.is_training()
+                                for prev_node in self.flow[:nodenr]]):
+                        filtered = collected
+                    collected = None
                 self._stop_training_hook()
                 if node.get_remaining_train_phase() > 1:
                     # close the previous training phase
@@ -215,6 +354,27 @@ def _train_node(self, data_iterable, nodenr):
             # capture any other exception occured during training.
             self._propagate_exception(e, nodenr)
 
+    def _execute_shared_data(self, data, nodenr):
+        """Return the shared training data filtered through the nodes
+        0..'nodenr'.
+
+        Only the nodes after the last node which was already used to filter
+        'data' are executed, the result is stored in 'data'.
+        """
+        if data.nodenr > nodenr:
+            return self._execute_seq(data[0], nodenr)
+        x = data.filtered
+        if data.nodenr < 0 and self.dtype is not None:
+            x = mdp.utils.refcast(x, self.dtype)
+        for i in range(data.nodenr+1, nodenr+1):
+            try:
+                x = self.flow[i].execute(x)
+            except Exception, e:
+                self._propagate_exception(e, i)
+            data.filtered = x
+            data.nodenr = i
+        return x
+
     def _stop_training_hook(self):
         """Hook method that is called before stop_training is called."""
         pass
@@ -245,7 +405,8 @@ def _train_check_iterables(self, data_iterables):
         # if a single array is given wrap it in a list of lists,
         # note that a list of 2d arrays is not valid
         if isinstance(data_iterables, numx.ndarray):
-            data_iterables = [[data_iterables]] * len(flow)
+            # the wrapped array passes all the following checks
+            return [_SharedTrainingData(data_iterables)] * len(flow)
 
         if not isinstance(data_iterables, list):
             err_str = ("'data_iterables' must be either a list of "
@@ -278,6 +439,53 @@ def _close_last_node(self):
         except Exception, e:
             self._propagate_exception(e, len(self.flow)-1)
 
+    def fuse_linear_nodes(self):
+        """Combine the projections of consecutive linear nodes.
+
+        For every run of at least two trained linear projection nodes
+        with the same dtype (PCANode, WhiteningNode, SFANode) the
+        projection matrices and biases are multiplied out, so that the run
+        is executed with a single matrix multiplication. Note that the
+        result can differ from the one of the single nodes by rounding
+        errors.
+
+        Return True if any nodes were combined, False otherwise.
+
+        As for 'compile', this has to be done again after the nodes have
+        been modified, changing the sequence of nodes discards the combined
+        projections. While an extension is active, the nodes are executed
+        as usual.
+        """
+        flow = self.flow
+        fused = {}
+        start = 0
+        while start < len(flow):
+            transform = mdp.utils.get_affine_transform(flow[start])
+            if transform is None:
+                start += 1
+                continue
+            matrix, bias = transform
+            dtype = flow[start].dtype
+            stop = start + 1
+            while stop < len(flow):
+                transform = mdp.utils.get_affine_transform(flow[stop])
+                if transform is None or flow[stop].dtype != dtype:
+                    break
+                # (x*m0 - b0)*m1 - b1 = x*(m0*m1) - (b0*m1 + b1)
+                bias = mdp.utils.mult(bias, transform[0]) + transform[1]
+                matrix = mdp.utils.mult(matrix, transform[0])
+                stop += 1
+            if stop - start > 1:
+                fused[start] = (flow[start:stop], stop, dtype, matrix, bias)
+            start = stop
+        self._fused = fused or None
+        return bool(fused)
+
+    def _reset_linear_nodes(self):
+        """Discard the combined projections of the linear nodes."""
+        self._compiled = None
+        self._fused = None
+
     def set_crash_recovery(self, state = True):
         """Set crash recovery capabilities.
 
@@ -296,7 +504,36 @@ def set_crash_recovery(self, state = True):
         """
         self._crash_recovery = state
 
-    def train(self, data_iterables):
+    def set_input_mode(self, mode=None):
+        """Specialize 'execute' and 'inverse' for one kind of input.
+
+        If 'mode' is 'array', the input is always a single data array.
+        If 'mode' is 'iterable', the input is always an iterable of data
+        arrays. In both cases the type of the input is not checked for
+        every call. If 'mode' is None (the default), both kinds of input
+        are accepted.
+        """
+        if mode not in (None, 'array', 'iterable'):
+            err_str = "Unknown input mode: %s" % str(mode)
+            raise FlowException(err_str)
+        cls = type(self)
+        if ((mode is not None) and
+            ((mdp.utils.get_defining_class(cls, 'execute') is not Flow) or
+             (mdp.utils.get_defining_class(cls, 'inverse') is not Flow))):
+            err_str = "%s does not support an input mode" % cls.__name__
+            raise FlowException(err_str)
+        self._input_mode = mode
+        # remove the previously specialized methods
+        self.__dict__.pop('execute', None)
+        self.__dict__.pop('inverse', None)
+        if mode == 'array':
+            self.execute = self._execute_array
+            self.inverse = self._inverse_array
+        elif mode == 'iterable':
+            self.execute = self._execute_iterable
+            self.inverse = self._inverse_iterable
+
+    def train(self, data_iterables, cache_data=False):
         """Train all trainable nodes in the flow.
 
         'data_iterables' is a list of iterables, one for each node in the flow.
@@ -319,6 +556,12 @@ def train(self, data_iterables):
         Instead of a data array 'x' the iterators can also return a list or
         tuple, where the first entry is 'x' and the following are args for the
         training of the node (e.g. for supervised training).
+
+        If 'cache_data' is True, the data arrays filtered through the
+        previous nodes are stored during the first training phase of a node
+        with multiple training phases, and are reused in the following
+        phases instead of executing the previous nodes again. Note that
+        all the filtered data for a node must then fit into memory.
         """
 
         data_iterables = self._train_check_iterables(data_iterables)
@@ -327,7 +570,7 @@ def train(self, data_iterables):
         for i in range(len(self.flow)):
             if self.verbose:
                 print "Training node #%d (%s)" % (i, str(self.flow[i]))
-            self._train_node(data_iterables[i], i)
+            self._train_node(data_iterables[i], i, cache_data)
             if self.verbose:
                 print "Training finished"
 
@@ -338,14 +581,42 @@ def _execute_seq(self, x, nodenr = None):
         flow = self.flow
         if nodenr is None:
             nodenr = len(flow)-1
-        for i in range(nodenr+1):
+        if self.dtype is not None and isinstance(x, numx.ndarray):
+            x = mdp.utils.refcast(x, self.dtype)
+        compiled = self._compiled
+        # for an invalid input let the nodes raise the appropriate exception
+        # extensions can change the execution of the nodes
+        if (compiled is not None and compiled[0] == flow and
+            _is_affine_input(x, compiled[2][0]) and
+            not mdp.get_active_extensions()):
+            x = numx.ascontiguousarray(mdp.utils.refcast(x, compiled[1]))
+            try:
+                return _get_affine_chain()(x, compiled[2][:nodenr+1],
+                                           compiled[3][:nodenr+1])
+            except Exception, e:
+                # the failing node is not known, report the first one
+                self._propagate_exception(e, 0)
+        fused = self._fused
+        if fused and mdp.get_active_extensions():
+            fused = None
+        i = 0
+        while i <= nodenr:
+            if fused and i in fused:
+                nodes, stop, dtype, matrix, bias = fused[i]
+                if (stop <= nodenr+1 and flow[i:stop] == nodes and
+                    _is_affine_input(x, matrix)):
+                    x = mdp.utils.mult(mdp.utils.refcast(x, dtype),
+                                       matrix) - bias
+                    i = stop
+                    continue
             try:
                 x = flow[i].execute(x)
             except Exception, e:
                 self._propagate_exception(e, i)
+            i += 1
         return x
 
-    def execute(self, iterable, nodenr = None):
+    def execute(self, iterable, nodenr = None, batch = False):
         """Process the data through all nodes in the flow.
 
         'iterable' is an iterable or iterator (note that a list is also an
@@ -354,22 +625,141 @@ def execute(self, iterable, nodenr = None):
 
         If 'nodenr' is specified, the flow is executed only up to
         node nr. 'nodenr'. This is equivalent to 'flow[:nodenr+1](iterable)'.
+
+        If 'batch' is True and 'iterable' is a list or tuple of data arrays,
+        the arrays are joined and sent through the flow in a single pass,
+        which avoids the overhead of calling every node once per array.
+        This is only equivalent to the default behavior if the nodes
+        process the data rows independently (e.g. this is not the case for
+        a TimeFramesNode).
+
+        To distribute the data arrays over several processes use a
+        'mdp.parallel.ParallelFlow' with a scheduler (e.g.
+        'mdp.parallel.ProcessScheduler').
         """
         if isinstance(iterable, numx.ndarray):
             return self._execute_seq(iterable, nodenr)
+        return self._execute_iterable(iterable, nodenr, batch)
+
+    def _execute_array(self, x, nodenr = None, batch = False):
+        # Process a single data array, 'batch' has no effect in this case
+        return self._execute_seq(x, nodenr)
+
+    def _execute_iterable(self, iterable, nodenr = None, batch = False):
+        # Process the data arrays returned by 'iterable' through the nodes
+        if batch:
+            x = self._join_chunks(iterable)
+            if x is not None:
+                return self._execute_seq(x, nodenr)
+        return self._join_results(iterable,
+                                  lambda x: self._execute_seq(x, nodenr),
+                                  "execute")
+
+    @staticmethod
+    def _join_chunks(iterable):
+        """Return the data arrays in 'iterable' joined into a single array.
+
+        Return None if 'iterable' is not a list or tuple of 2d arrays with
+        the same number of columns and dtype, or if it is empty.
+        """
+        if not isinstance(iterable, (list, tuple)) or not iterable:
+            return None
+        first = iterable[0]
+        for x in iterable:
+            if not (isinstance(x, numx.ndarray) and x.ndim == 2 and
+                    x.shape[1] == first.shape[1] and x.dtype == first.dtype):
+                return None
+        if len(iterable) == 1:
+            return first
+        return numx.concatenate(iterable)
+
+    @staticmethod
+    def _join_results(iterable, process, name):
+        """Apply 'process' to the data arrays in 'iterable' and join the
+        results along the first axis.
+
+        If 'iterable' is a list or tuple of arrays, the result array is
+        allocated after processing the first array and every result is
+        directly written into it. If a result does not have the same number
+        of rows as the corresponding input array, or if 'iterable' is a
+        generic iterable, the results are collected and concatenated.
+
+        'name' is used for the error message in case 'iterable' is empty.
+        """
+        # the size of the result can only be predicted when the
+        # chunks are known in advance
+        predictable = (isinstance(iterable, (list, tuple)) and
+                       all([isinstance(x, numx.ndarray) for x in iterable]))
+        out = None
+        row = 0
         res = []
         empty_iterator = True
         for x in iterable:
             empty_iterator = False
-            res.append(self._execute_seq(x, nodenr))
+            y = process(x)
+            if predictable:
+                if (out is None and isinstance(y, numx.ndarray) and
+                    len(y) == len(x)):
+                    n_rows = sum([len(chunk) for chunk in iterable])
+                    out = numx.empty((n_rows,) + y.shape[1:], dtype=y.dtype)
+                if (out is not None and len(y) == len(x) and
+                    y.shape[1:] == out.shape[1:] and y.dtype == out.dtype):
+                    out[row:row+len(y)] = y
+                    row += len(y)
+                    continue
+                # the result size is not predictable after all,
+                # fall back to collecting the results
+                predictable = False
+                if out is not None:
+                    res.append(out[:row])
+            res.append(y)
         if empty_iterator:
-            errstr = ("The execute data iterator is empty.")
+            errstr = ("The %s data iterator is empty." % name)
             raise FlowException(errstr)
+        if not res:
+            return out
         return numx.concatenate(res)
 
+    def compile(self):
+        """Prepare a fast execution path for a flow of linear nodes.
+
+        If all the nodes in the flow are trained linear projection nodes
+        with the same dtype (PCANode, WhiteningNode, SFANode), their
+        projection matrices are collected and the flow is executed by a
+        single function instead of calling each node. If numba is available
+        this function is compiled to native code.
+
+        Return True if the flow was compiled, False otherwise (in which
+        case the nodes are executed as usual).
+
+        Note that the flow has to be compiled again after its nodes have
+        been modified. Changing the sequence of nodes in the flow discards
+        the compiled version. While an extension is active, the nodes are
+        executed as usual.
+        """
+        self._compiled = None
+        transforms = [mdp.utils.get_affine_transform(node)
+                      for node in self.flow]
+        if (not transforms or
+            any([transform is None for transform in transforms])):
+            return False
+        dtype = self.flow[0].dtype
+        if any([node.dtype != dtype for node in self.flow]):
+            return False
+        matrices = tuple([numx.ascontiguousarray(matrix)
+                          for matrix, _ in transforms])
+        biases = tuple([numx.ascontiguousarray(bias.ravel())
+                        for _, bias in transforms])
+        self._compiled = (list(self.flow), dtype, matrices, biases)
+        # import numba now rather than in the first execution
+        _get_affine_chain()
+        return True
+
     def _inverse_seq(self, x):
         #Successively invert input data 'x' through all nodes backwards
         flow = self.flow
+        if self.dtype is not None and isinstance(x, numx.ndarray):
+            x = mdp.utils.refcast(x, self.dtype)
         for i in range(len(flow)-1, -1, -1):
             try:
                 x = flow[i].inverse(x)
@@ -377,7 +767,7 @@ def _inverse_seq(self, x):
                 self._propagate_exception(e, i)
         return x
 
-    def inverse(self, iterable):
+    def inverse(self, iterable, batch = False):
         """Process the data through all nodes in the flow backwards
         (starting from the last node up to the first node) by calling the
         inverse function of each node. Of course, all nodes in the
@@ -389,19 +779,25 @@ def inverse(self, iterable):
 
         Note that this is _not_ equivalent to 'flow[::-1](iterable)',
         which also executes the flow backwards but calls the 'execute'
-        function of each node."""
+        function of each node.
+
+        The 'batch' argument has the same meaning as for 'execute'."""
 
         if isinstance(iterable, numx.ndarray):
             return self._inverse_seq(iterable)
-        res = []
-        empty_iterator = True
-        for x in iterable:
-            empty_iterator = False
-            res.append(self._inverse_seq(x))
-        if empty_iterator:
-            errstr = ("The inverse data iterator is empty.")
-            raise FlowException(errstr)
-        return numx.concatenate(res)
+        return self._inverse_iterable(iterable, batch)
+
+    def _inverse_array(self, x, batch = False):
+        # Invert a single data array, 'batch' has no effect in this case
+        return self._inverse_seq(x)
+
+    def _inverse_iterable(self, iterable, batch = False):
+        # Invert the data arrays returned by 'iterable' through the nodes
+        if batch:
+            x = self._join_chunks(iterable)
+            if x is not None:
+                return self._inverse_seq(x)
+        return self._join_results(iterable, self._inverse_seq, "inverse")
 
     def copy(self, protocol=None):
         """Return a deep copy of the flow.
@@ -427,9 +823,22 @@ def save(self, filename, protocol=-1):
             with open(filename, mode) as flh:
                 _cPickle.dump(self, flh, protocol)
 
+    def __getstate__(self):
+        # the specialized methods are bound to the instance and cannot be
+        # pickled, they are restored in '__setstate__'
+        state = self.__dict__.copy()
+        state.pop('execute', None)
+        state.pop('inverse', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.set_input_mode(self._input_mode)
+
     def __call__(self, iterable, nodenr = None):
         """Calling an instance is equivalent to call its 'execute' method."""
-        return self.execute(iterable, nodenr=nodenr)
+        # nodenr is passed by position, which is cheaper than by keyword
+        return self.execute(iterable, nodenr)
 
     ###### string representation
 
@@ -458,16 +867,42 @@ def _check_dimension_consistency(self, out, inp):
             errstr = "dimensions mismatch: %d != %d" % (out, inp)
             raise ValueError(errstr)
 
-    def _check_nodes_consistency(self, flow = None):
-        """Check the dimension consistency of a list of nodes."""
+    def _check_nodes_consistency(self, flow = None, start = 0, stop = None):
+        """Check the dimension consistency of a list of nodes.
+
+        If 'start' or 'stop' are given, only the nodes with an index in
+        range(start, stop) are checked against their predecessor.
+        """
         if flow is None:
             flow = self.flow
         len_flow = len(flow)
-        for i in range(1, len_flow):
+        if stop is None or stop > len_flow:
+            stop = len_flow
+        for i in range(max(start, 1), stop):
             out = flow[i-1].output_dim
             inp = flow[i].input_dim
             self._check_dimension_consistency(out, inp)
 
+    @staticmethod
+    def _get_changed_range(key, old_len, new_len):
+        """Return the (start, stop) range of the nodes that have to be
+        checked against their predecessor after the nodes at 'key' were
+        replaced or deleted.
+
+        'old_len' and 'new_len' are the lengths of the list of nodes before
+        and after the modification. For extended slices (0, None) is
+        returned, so that all the nodes are checked.
+        """
+        if not isinstance(key, slice):
+            if key < 0:
+                key += old_len
+            return key, key + 1 + new_len - old_len + 1
+        start, stop, step = key.indices(old_len)
+        if step != 1:
+            return 0, None
+        n_inserted = new_len - old_len + max(0, stop - start)
+        return start, start + n_inserted + 1
+
     def _check_value_type_isnode(self, value):
         if not isinstance(value, mdp.Node):
             raise TypeError("flow item must be Node instance")
@@ -482,26 +917,35 @@ def __getitem__(self, key):
 
     def __setitem__(self, key, value):
         if isinstance(key, slice):
-            [self._check_value_type_isnode(item) for item in value]
+            if not all(isinstance(item, mdp.Node) for item in value):
+                raise TypeError("flow item must be Node instance")
         else:
             self._check_value_type_isnode(value)
 
         # make a copy of list
         flow_copy = list(self.flow)
         flow_copy[key] = value
-        # check dimension consistency
-        self._check_nodes_consistency(flow_copy)
+        # check dimension consistency, only the new nodes and their
+        # neighbors have to be checked
+        start, stop = self._get_changed_range(key, len(self.flow),
+                                              len(flow_copy))
+        self._check_nodes_consistency(flow_copy, start, stop)
         # if no exception was raised, accept the new sequence
         self.flow = flow_copy
+        self._reset_linear_nodes()
 
     def __delitem__(self, key):
         # make a copy of list
         flow_copy = list(self.flow)
         del flow_copy[key]
-        # check dimension consistency
-        self._check_nodes_consistency(flow_copy)
+        # check dimension consistency, only the nodes next to the
+        # deleted ones have to be checked
+        start, stop = self._get_changed_range(key, len(self.flow),
+                                              len(flow_copy))
+        self._check_nodes_consistency(flow_copy, start, stop)
         # if no exception was raised, accept the new sequence
         self.flow = flow_copy
+        self._reset_linear_nodes()
 
     def __contains__(self, item):
         return self.flow.__contains__(item)
@@ -540,6 +984,7 @@ def __iadd__(self, other):
                        ' (not \'%s\') to flow' % (type(other).__name__))
             raise TypeError(err_str)
         self._check_nodes_consistency(self.flow)
+        self._reset_linear_nodes()
         return self
 
     ###### public container methods
@@ -585,7 +1030,7 @@ def _train_check_checkpoints(self, checkpoints):
         return checkpoints
 
 
-    def train(self, data_iterables, checkpoints):
+    def train(self, data_iterables, checkpoints, cache_data=False):
         """Train all trainable nodes in the flow.
 
         In addition to the basic behavior (see 'Node.train'), calls the
@@ -598,6 +1043,8 @@ def train(self, data_iterables, checkpoints):
 
         The class CheckpointFunction can be used to define user-supplied
         checkpoint functions.
+
+        The 'cache_data' argument has the same meaning as for 'Flow.train'.
         """
 
         data_iterables = self._train_check_iterables(data_iterables)
@@ -608,7 +1055,7 @@ def train(self, data_iterables, checkpoints):
             node = self.flow[i]
             if self.verbose:
                 print "Training node #%d (%s)" % (i, type(node).__name__)
-            self._train_node(data_iterables[i], i)
+            self._train_node(data_iterables[i], i, cache_data)
             if (i <= len(checkpoints)) and (checkpoints[i] is not None):
                 dic = checkpoints[i](node)
                 if dic:
@@ -640,7 +1087,8 @@ class CheckpointSaveFunction(CheckpointFunction):
     and continue the training.
     """
 
-    def __init__(self, filename, stop_training=0, binary=1, protocol=2):
+    def __init__(self, filename, stop_training=0, binary=1, protocol=2,
+                 array_files=False):
         """CheckpointSaveFunction constructor.
 
         'filename'      -- the name of the pickle dump file.
@@ -653,10 +1101,17 @@ def __init__(self, filename, stop_training=0, binary=1, protocol=2):
                            the file is opened in binary mode.
         'protocol'      -- is the 'protocol' argument for the pickle dump
                            (see Pickle documentation for details)
+        'array_files'   -- if True, the arrays of the node are not pickled
+                           but written directly to the files
+                           'filename.arrN.npy' (using numpy.save), which
+                           avoids copying them into the pickle stream.
+                           Use 'CheckpointSaveFunction.load' to load such
+                           a dump.
         """
         self.filename = filename
         self.proto = protocol
         self.stop_training = stop_training
+        self.array_files = array_files
         if binary or protocol > 0:
             self.mode = 'wb'
         else:
@@ -666,4 +1121,49 @@ def __call__(self, node):
         with open(self.filename, self.mode) as fid:
             if self.stop_training:
                 node.stop_training()
-            _cPickle.dump(node, fid, self.proto)
+            if self.array_files:
+                pickler = _cPickle.Pickler(fid, self.proto)
+                pickler.persistent_id = self._get_array_saver()
+                pickler.dump(node)
+            else:
+                _cPickle.dump(node, fid, self.proto)
+
+    def _get_array_saver(self):
+        """Return a 'persistent_id' function for the pickler, which saves
+        the arrays to separate files."""
+        # map array id to persistent id, so that shared arrays stay shared
+        saved = {}
+        def save_array(obj):
+            if type(obj) is not numx.ndarray or obj.dtype.hasobject:
+                return None
+            if id(obj) not in saved:
+                pid = str(len(saved))
+                numx.save(self._array_filename(self.filename, pid), obj)
+                # keep a reference to obj, otherwise its id could be reused
+                saved[id(obj)] = (pid, obj)
+            return saved[id(obj)][0]
+        return save_array
+
+    @staticmethod
+    def _array_filename(filename, pid):
+        return '%s.arr%s.npy' % (filename, pid)
+
+    @staticmethod
+    def load(filename):
+        """Load and return the node dumped on 'filename'.
+
+        This is required when the node was dumped with 'array_files' set,
+        otherwise the pickle module can be used directly.
+        """
+        # the unpickler does not memoize persistent ids, so that each
+        # array is loaded only once to keep shared arrays shared
+        loaded = {}
+        def load_array(pid):
+            if pid not in loaded:
+                loaded[pid] = numx.load(
+                    CheckpointSaveFunction._array_filename(filename, pid))
+            return loaded[pid]
+        with open(filename, 'rb') as fid:
+            unpickler = _cPickle.Unpickler(fid)
+            unpickler.persistent_load = load_array
+            return unpickler.load()
@@ -240,8 +240,12 @@ def __init__(self, flow, verbose=False, **kwargs):
         """Initialize the internal variables.
 
         Note that the crash_recovery flag is is not supported, so it is
-        disabled.
+        disabled. The dtype option of Flow is not supported either, the
+        data can be converted by a custom train / execute callable class.
         """
+        if kwargs.get("dtype") is not None:
+            err = "ParallelFlow does not support the dtype option."
+            raise ParallelFlowException(err)
         kwargs["crash_recovery"] = False
         super(ParallelFlow, self).__init__(flow, verbose=verbose,
                                            **kwargs)
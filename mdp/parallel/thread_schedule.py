@@ -4,7 +4,7 @@
 
 import threading
 import time
-import cPickle as pickle
+import copy
 
 from scheduling import Scheduler, cpu_count
 
@@ -63,8 +63,7 @@ def _process_task(self, data, task_callable, task_index):
                     # create a deep copy of the task_callable,
                     # since it might not be thread safe 
                     # (but the fork is still required)
-                    as_str = pickle.dumps(task_callable, -1)
-                    task_callable = pickle.loads(as_str)
+                    task_callable = copy.deepcopy(task_callable)
                 try:
                     thread = threading.Thread(target=self._task_thread,
                                               args=(data, task_callable,
@@ -4,6 +4,7 @@
 import pickle
 import cPickle
 import os
+import sys
 from _tools import *
 
 uniform = numx_rand.random
@@ -34,6 +35,64 @@ def testFlow():
     rec = flow.inverse(out)
     assert_array_equal(rec,inp)
 
+def testFlow_batch():
+    chunks = [uniform((10,3)) for _ in xrange(4)]
+    flow = _get_default_flow()
+    out = flow.execute(chunks)
+    assert_array_equal(flow.execute(chunks, batch=True), out)
+    assert_array_equal(flow.execute(tuple(chunks), batch=True), out)
+    # iterators are processed chunk by chunk
+    assert_array_equal(flow.execute(iter(chunks), batch=True), out)
+    rec = flow.inverse([out[:15], out[15:]], batch=True)
+    assert_array_equal(rec, numx.concatenate(chunks))
+
+def testFlow_input_mode():
+    inp = numx.ones((100,3))
+    flow = mdp.Flow([BogusNode(), BogusNode()], input_mode='array')
+    assert_array_equal(flow(inp), 4*inp)
+    assert_array_equal(flow.inverse(4*inp), inp)
+    assert_array_equal(flow.execute(inp, batch=True), 4*inp)
+    assert_array_equal(flow.inverse(4*inp, batch=True), inp)
+    # the specialization survives pickling
+    copy_flow = cPickle.loads(flow.save(None))
+    assert_array_equal(copy_flow.execute(inp, 0), 2*inp)
+    flow.set_input_mode('iterable')
+    assert_array_equal(flow.execute([inp, inp]), 4*numx.ones((200,3)))
+    assert_array_equal(flow.inverse([4*inp]), inp)
+    flow.set_input_mode()
+    assert_array_equal(flow.execute(inp), 4*inp)
+    py.test.raises(mdp.FlowException, flow.set_input_mode, 'list')
+
+def testFlow_dtype():
+    inp = uniform((200,5))
+    flow = mdp.Flow([mdp.nodes.PCANode(), mdp.nodes.SFANode(output_dim=3)],
+                    dtype='float32')
+    flow.train(inp)
+    for node in flow:
+        assert_equal(node.dtype, numx.dtype('float32'))
+    out = flow(inp)
+    assert_equal(out.dtype, numx.dtype('float32'))
+    ref_flow = mdp.Flow([mdp.nodes.PCANode(), mdp.nodes.SFANode(output_dim=3)])
+    ref_flow.train(inp)
+    # the slow features are only defined up to the sign
+    assert_array_almost_equal(abs(out), abs(ref_flow(inp)), 2)
+    # data would be truncated by an integer dtype
+    py.test.raises(mdp.FlowException, mdp.Flow, [mdp.nodes.IdentityNode()],
+                   dtype='int32')
+
+def testFlow_execute_result_size():
+    # the number of output rows differs from the number of input rows
+    chunks = [uniform((10,3)) for _ in xrange(3)]
+    node = mdp.nodes.TimeFramesNode(2)
+    flow = mdp.Flow([node])
+    out = flow.execute(chunks)
+    assert_equal(out.shape, (27, 6))
+    assert_array_equal(out, numx.concatenate([node.execute(x)
+                                              for x in chunks]))
+    # the result is a new array, also for a single chunk
+    flow = mdp.Flow([mdp.nodes.IdentityNode()])
+    assert flow.execute(iter(chunks[:1])) is not chunks[0]
+
 def testFlow_copy():
     dummy_list = [1,2,3]
     flow = _get_default_flow()
@@ -51,6 +110,108 @@ def test_Flow_copy_with_lambda():
     generic_flow = mdp.Flow([generic_node])
     generic_flow.copy()
     
+def testFlow_compile():
+    inp = uniform((200,5))
+    flow = mdp.Flow([mdp.nodes.PCANode(), mdp.nodes.WhiteningNode(),
+                     mdp.nodes.SFANode(output_dim=3)])
+    flow.train(inp)
+    out = flow(inp)
+    part = flow(inp, nodenr=1)
+    assert flow.compile()
+    assert_array_almost_equal(flow(inp), out, decimal-2)
+    assert_array_almost_equal(flow(inp, nodenr=1), part, decimal-2)
+    # changing the flow discards the compiled version
+    flow.append(mdp.nodes.IdentityNode())
+    assert flow._compiled is None
+    assert_array_almost_equal(flow(inp), out, decimal-2)
+    # the flow contains a non linear node
+    assert not flow.compile()
+    assert not _get_default_flow().compile()
+
+@skip_on_condition("not mdp.config.has_numba", "This test requires numba")
+def testFlow_compile_numba():
+    inp = uniform((200,5))
+    flow = mdp.Flow([mdp.nodes.PCANode(), mdp.nodes.WhiteningNode(),
+                     mdp.nodes.SFANode(output_dim=3)])
+    flow.train(inp)
+    out = flow(inp)
+    part = flow(inp, nodenr=1)
+    assert flow.compile()
+    # the chain is executed by the function compiled with numba
+    linear_flows = sys.modules['mdp.linear_flows']
+    assert linear_flows._affine_chain is not \
+           linear_flows._execute_affine_chain
+    assert_array_almost_equal(flow(inp), out, decimal-2)
+    assert_array_almost_equal(flow(inp, nodenr=1), part, decimal-2)
+    assert_array_almost_equal(flow(inp, nodenr=0), flow[0](inp), decimal-2)
+
+def testFlow_compile_exception():
+    inp = uniform((200,5))
+    flow = mdp.Flow([mdp.nodes.PCANode(), mdp.nodes.SFANode()])
+    flow.train(inp)
+    assert flow.compile()
+    def _failing_chain(x, matrices, biases):
+        raise Exception("Bogus Exception")
+    linear_flows = sys.modules['mdp.linear_flows']
+    affine_chain = linear_flows._get_affine_chain()
+    linear_flows._affine_chain = _failing_chain
+    try:
+        py.test.raises(mdp.FlowExceptionCR, flow.execute, inp)
+    finally:
+        linear_flows._affine_chain = affine_chain
+
+def _activate_test_pca_extension():
+    # extension which changes the execution of PCANode
+    class _TestExtensionNode(mdp.ExtensionNode):
+        extension_name = "__test_flows"
+    class _TestPCANode(_TestExtensionNode, mdp.nodes.PCANode):
+        def _execute(self, x, n=None):
+            return numx.zeros((len(x), self.output_dim), dtype=self.dtype)
+    mdp.activate_extension("__test_flows")
+
+def _remove_test_pca_extension():
+    mdp.deactivate_extension("__test_flows")
+    del mdp.get_extensions()["__test_flows"]
+
+def testFlow_compile_extension():
+    inp = uniform((200,5))
+    flow = mdp.Flow([mdp.nodes.PCANode(output_dim=3)])
+    flow.train(inp)
+    assert flow.compile()
+    _activate_test_pca_extension()
+    try:
+        # the extended node is executed instead of the compiled chain
+        assert_array_equal(flow(inp), numx.zeros((200,3)))
+    finally:
+        _remove_test_pca_extension()
+    assert_array_almost_equal(flow(inp), flow[0](inp))
+
+def testFlow_fuse_linear_nodes():
+    inp = uniform((200,5))
+    nodes = [mdp.nodes.PCANode(), mdp.nodes.SFANode(output_dim=4),
+             BogusNode(), mdp.nodes.PCANode(output_dim=3)]
+    flow = mdp.Flow(nodes)
+    flow.train(inp)
+    assert flow._fused is None
+    assert flow.fuse_linear_nodes()
+    # only the first two nodes are combined
+    assert_equal(flow._fused.keys(), [0])
+    out = inp
+    for node in nodes:
+        out = node.execute(out)
+    assert_array_almost_equal(flow(inp), out, decimal-2)
+    assert_array_almost_equal(flow(inp, nodenr=0), nodes[0](inp))
+    _activate_test_pca_extension()
+    try:
+        # the extended nodes are executed instead of the combined projection
+        assert_array_almost_equal(flow(inp), numx.zeros((200,3)))
+    finally:
+        _remove_test_pca_extension()
+    # replacing a node discards the combined projection
+    flow[3] = BogusNode()
+    assert flow._fused is None
+    assert not _get_default_flow().fuse_linear_nodes()
+
 def testFlow_save():
     dummy_list = [1,2,3]
     flow = _get_default_flow()
@@ -197,6 +358,31 @@ def testFlow_container_listmethods():
     except ValueError:
         assert_equal(len(flow), length)
 
+def testFlow_setitem_type_check():
+    flow = _get_default_flow()
+    py.test.raises(TypeError, flow.__setitem__, 1, 'node')
+    py.test.raises(TypeError, flow.__setitem__, slice(1, 2),
+                   [BogusNode(), 'node'])
+    assert_equal(len(flow), 3)
+
+def testFlow_container_local_consistency():
+    # only the modified nodes and their neighbors are checked
+    flow = mdp.Flow([BogusNode(input_dim=2, output_dim=2) for _ in xrange(5)])
+    py.test.raises(ValueError, flow.__setitem__, -1, BogusNode(input_dim=3))
+    py.test.raises(ValueError, flow.__setitem__, 2, BogusNode(output_dim=3))
+    py.test.raises(ValueError, flow.__setitem__, slice(1, 3),
+                   [BogusNode(output_dim=2), BogusNode(input_dim=3)])
+    py.test.raises(ValueError, flow.__setitem__, slice(1, 3),
+                   [BogusNode(), BogusNode(output_dim=3)])
+    py.test.raises(ValueError, flow.__setitem__, 1,
+                   BogusNode(input_dim=2, output_dim=3))
+    flow[1:2] = [BogusNode(input_dim=2, output_dim=3),
+                 BogusNode(input_dim=3, output_dim=2)]
+    assert_equal(len(flow), 6)
+    py.test.raises(ValueError, flow.__delitem__, 2)
+    del flow[1:3]
+    assert_equal(len(flow), 4)
+
 def testFlow_append_node_copy():
     # when appending a node to a flow,
     # we don't want the flow to be a copy!
@@ -278,6 +464,24 @@ def testCheckpointFunction():
     for i in xrange(len(flow)):
         assert flow[i].__class__==cfunc.classes[i], 'Wrong class collected'
 
+def testCheckpointSaveFunction_array_files():
+    dummy_file = tempfile.mktemp(prefix='MDP_', suffix=".pic",
+                                 dir=py.test.mdp_tempdirname)
+    cfunc = mdp.CheckpointSaveFunction(dummy_file, stop_training=1,
+                                       array_files=True)
+    flow = mdp.CheckpointFlow([mdp.nodes.PCANode()])
+    flow.train(uniform((100,3)), cfunc)
+    node = mdp.CheckpointSaveFunction.load(dummy_file)
+    assert os.path.exists(dummy_file + '.arr0.npy')
+    assert_array_equal(node.v, flow[0].v)
+    assert_array_equal(node.avg, flow[0].avg)
+    assert_equal(node(uniform((10,3))).shape, (10,3))
+    # an array referenced twice is saved and loaded only once
+    flow[0].shared = flow[0].v
+    mdp.CheckpointSaveFunction(dummy_file, array_files=True)(flow[0])
+    node = mdp.CheckpointSaveFunction.load(dummy_file)
+    assert node.shared is node.v
+
 def testCrashRecovery():
     flow = mdp.Flow([BogusExceptNode()])
     flow.set_crash_recovery(1)
@@ -296,6 +500,23 @@ def testCrashRecovery():
         assert isinstance(e,mdp.FlowExceptionCR)
         assert not hasattr(e,'filename')
 
+def testFlowExceptionCR_message():
+    flow = mdp.Flow([BogusNode(), BogusExceptNode()])
+    try:
+        flow.execute(numx.zeros((1,2), 'd'))
+    except mdp.FlowExceptionCR, e:
+        errstr = str(e)
+        assert 'Exception in node #1 (BogusExceptNode)' in errstr
+        assert 'Bogus Exception' in errstr
+        assert 'in _execute' in errstr
+        assert_equal(str(e), errstr)
+        # the message is a plain string and no frames are kept
+        assert isinstance(e.args[0], str)
+        assert 'Exception in node #1 (BogusExceptNode)' in e.args[0]
+        assert 'FlowExceptionCR' in repr(e)
+        for entry in e._node_traceback:
+            assert isinstance(entry, tuple)
+
 def testCrashRecoveryException():
     a = 3
     try:
@@ -341,3 +562,33 @@ def testgenerator():
         raise Exception('Expected mdp.FlowException')
     except mdp.FlowException:
         pass
+
+class _CountingNode(BogusNode):
+    def __init__(self):
+        super(_CountingNode, self).__init__()
+        self.n_executed = 0
+    def _execute(self, x):
+        self.n_executed += 1
+        return 2*x
+
+def testFlow_train_shared_data():
+    # a single data array is filtered only once through each node
+    nodes = [_CountingNode(), _CountingNode(), BogusMultiNode(),
+             BogusMultiNode()]
+    flow = mdp.Flow(nodes)
+    flow.train(mdp.numx.ones((1,2), 'd'))
+    assert_equal([node.n_executed for node in nodes[:2]], [1, 1])
+    assert nodes[3].visited == [1,2,3,4]
+
+def testFlow_train_cache_data():
+    chunks = [mdp.numx.ones((1,2), 'd') for _ in xrange(3)]
+    node = _CountingNode()
+    flow = mdp.Flow([node, BogusMultiNode()])
+    flow.train([None, chunks])
+    assert_equal(node.n_executed, 6)
+    node = _CountingNode()
+    flow = mdp.Flow([node, BogusMultiNode()])
+    flow.train([None, chunks], cache_data=True)
+    # the filtered data is reused in the second training phase
+    assert_equal(node.n_executed, 3)
+    assert flow[1].visited == [1,1,1,2,3,3,3,4]
@@ -250,6 +250,7 @@ def testRect2dRouting1():
     assert numx.all(sboard.connections ==
                            numx.array([0, 1, 2, 3, 2, 3, 4, 5, 6, 7,
                                        8, 9, 8, 9, 10, 11]))
+    assert sboard.connections.dtype == numx.intp
     x = numx.array([range(0, sboard.input_dim),
                     range(101, 101+sboard.input_dim)])
     sboard.execute(x)
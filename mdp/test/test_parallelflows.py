@@ -33,6 +33,12 @@ def test_non_iterator():
     x = n.random.random((100,10))
     flow.execute(x)
 
+def test_dtype_not_supported():
+    """Test that the dtype option of Flow is rejected."""
+    py.test.raises(parallel.ParallelFlowException, parallel.ParallelFlow,
+                   [mdp.nodes.PCANode(), mdp.nodes.SFANode()],
+                   dtype='float32')
+
 def test_multiple_schedulers():
     """Test parallel flow training with multiple schedulers."""
     flow = parallel.ParallelFlow([
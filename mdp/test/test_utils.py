@@ -35,6 +35,26 @@ def test_introspection():
     keys = ['_bias', 'avg', 'd', 'davg', 'sf']
     assert sorted(a_sfa.keys()) == keys, 'Wrong arrays in SFANode'
 
+def test_get_affine_transform():
+    x = numx_rand.random((100, 5))
+    for node in (nodes.PCANode(), nodes.WhiteningNode(), nodes.SFANode()):
+        node.train(x)
+        assert utils.get_affine_transform(node) is None
+        node.stop_training()
+        matrix, bias = utils.get_affine_transform(node)
+        assert_array_almost_equal(utils.mult(x, matrix) - bias,
+                                  node.execute(x))
+    # nodes which are not linear projections
+    assert utils.get_affine_transform(nodes.IdentityNode()) is None
+    poly = nodes.PolynomialExpansionNode(2)
+    assert utils.get_affine_transform(poly) is None
+
+def test_get_defining_class():
+    assert utils.get_defining_class(nodes.WhiteningNode,
+                                    '_execute') is nodes.PCANode
+    assert utils.get_defining_class(nodes.PCANode, 'copy') is Node
+    assert utils.get_defining_class(nodes.PCANode, 'bogus_attr') is None
+
 def test_random_rot():
     dim = 20
     tlen = 10
@@ -19,7 +19,8 @@
 except ImportError:
     from temporarydir import TemporaryDirectory
 
-from introspection import dig_node, get_node_size, get_node_size_str
+from introspection import (dig_node, get_node_size, get_node_size_str,
+                           get_affine_transform, get_defining_class)
 from quad_forms import QuadraticForm, QuadraticFormException
 from covariance import (CovarianceMatrix, DelayCovarianceMatrix,
                         MultipleCovarianceMatrices,CrossCovarianceMatrix)
@@ -81,7 +82,8 @@ def svd(x, compute_uv = True):
 __all__ = ['CovarianceMatrix', 'DelayCovarianceMatrix','CrossCovarianceMatrix',
            'MultipleCovarianceMatrices', 'QuadraticForm',
            'QuadraticFormException',
-           'comb', 'cov2', 'dig_node', 'get_dtypes', 'get_node_size',
+           'comb', 'cov2', 'dig_node', 'get_affine_transform',
+           'get_defining_class', 'get_dtypes', 'get_node_size',
            'hermitian', 'inv', 'mult', 'mult_diag', 'nongeneral_svd',
            'norm2', 'permute', 'pinv', 'progressinfo',
            'random_rot', 'refcast', 'rotate', 'scast', 'solve', 'sqrtm',
@@ -92,6 +92,33 @@ def dig_node(x):
         arrays[name] = (bytes, ar)
     return arrays, _format_dig(arrays)
 
+def get_defining_class(cls, name):
+    """Return the class in the MRO of 'cls' which defines the attribute
+    'name', or None if no class defines it.
+    """
+    for base in cls.__mro__:
+        if name in base.__dict__:
+            return base
+    return None
+
+def get_affine_transform(node):
+    """Return the tuple (matrix, bias) for which 'node.execute(x)' is
+    equal to 'mult(x, matrix) - bias'.
+
+    None is returned if the node is not a trained linear projection node
+    (PCANode, WhiteningNode, SFANode) or if an extension is active, since
+    extensions can change the behavior of the execution methods.
+    Subclasses overriding '_execute' are not considered linear.
+    """
+    if node.is_training() or mdp.get_active_extensions():
+        return None
+    cls = get_defining_class(type(node), '_execute')
+    if cls is mdp.nodes.PCANode:
+        return node.v, mdp.utils.mult(node.avg, node.v)
+    elif cls is mdp.nodes.SFANode:
+        return node.sf, node._bias
+    return None
+
 def get_node_size(x):
     """Return node total byte-size using cPickle with protocol=2.
 